@@ -4,21 +4,36 @@ import base64
 import pandas as pd
 from datetime import datetime
 from dateutil.parser import parse
-from flask import Flask, render_template, request, redirect, url_for, flash, send_from_directory, send_file
+from flask import Flask, render_template, request, redirect, url_for, flash, send_from_directory, Response, after_this_request
 from flask_wtf import FlaskForm
+from flask_compress import Compress
 from wtforms import StringField, TextAreaField, SelectField, PasswordField
 from wtforms.validators import DataRequired
-from functools import wraps
+from functools import wraps, lru_cache
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+import multiprocessing
+import threading
 from dotenv import load_dotenv
-from pymongo import MongoClient
+from pymongo import MongoClient, UpdateOne
+from pymongo.errors import PyMongoError
 import pdfkit
 from docxtpl import DocxTemplate
 import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
 from bson.objectid import ObjectId
-from jinja2 import Template
+from jinja2 import Environment
 import io, zipfile
+from zipstream import ZipStream
 from flask_login import LoginManager, UserMixin, login_user, logout_user, login_required, current_user
 import logging
+import hmac
+import re
+import unicodedata
+from urllib.parse import quote
+from argon2 import PasswordHasher
+from argon2.exceptions import VerificationError, InvalidHashError
 
 # Set up logging
 logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
@@ -31,32 +46,106 @@ SENDER_NAME = os.getenv("SENDER_NAME")
 SENDER_EMAIL = os.getenv("SENDER_EMAIL")
 
 # ---------------- APP INIT ---------------- #
+# True inside bulk-upload render workers, which re-import this module under "spawn"
+IS_RENDER_WORKER = multiprocessing.parent_process() is not None
+
 app = Flask(__name__)
 app.config["SECRET_KEY"] = os.getenv("SECRET_KEY", "your_secret_key")
 
+# Response compression for HTML/text only; generated PDFs/DOCX/ZIPs are already compressed.
+# Opt-in per view: compressing a page that reflects user input next to the CSRF
+# token would expose the token to BREACH.
+app.config["COMPRESS_REGISTER"] = False
+app.config["COMPRESS_ALGORITHM"] = ["br", "gzip"]
+app.config["COMPRESS_LEVEL"] = 4
+app.config["COMPRESS_MIMETYPES"] = ["text/html", "text/css", "application/json", "text/javascript"]
+compress = Compress(app)
+
 # Flask-Login setup
 login_manager = LoginManager()
 login_manager.init_app(app)
 login_manager.login_view = 'login'
 
-# MongoDB setup
-client = MongoClient(MONGO_URI)
+# MongoDB setup (one pooled client for the whole app; wire compression where available)
+def available_compressors():
+    # Only offer compressors whose libraries are installed; zlib is always built in
+    compressors = []
+    for name, module in [("zstd", "zstandard"), ("snappy", "snappy")]:
+        try:
+            __import__(module)
+            compressors.append(name)
+        except ImportError:
+            pass
+    compressors.append("zlib")
+    return ",".join(compressors)
+
+# connect=False: nothing is opened until the first operation, so render
+# workers (which re-import this module but never query) hold no connections
+client = MongoClient(
+    MONGO_URI,
+    connect=False,
+    maxPoolSize=50,
+    minPoolSize=5,
+    compressors=available_compressors(),
+    retryWrites=True,
+    w="majority",
+    serverSelectionTimeoutMS=3000,
+)
 db = client.get_database()
 candidates_col = db.candidates
 templates_col = db.templates
 audit_col = db.audit_logs
 users_col = db.users
 
+# Indexes for login lookups, home search and the audit log sort (not in render workers)
+if not IS_RENDER_WORKER:
+    # Each index on its own so one failure (e.g. duplicate usernames) doesn't skip the rest
+    for col, keys, options in [
+        (users_col, "username", {"unique": True}),
+        (audit_col, [("timestamp", -1)], {}),
+        (candidates_col, [("name", 1)], {}),
+        (candidates_col, [("email", 1)], {}),
+    ]:
+        try:
+            col.create_index(keys, **options)
+        except PyMongoError as e:
+            logging.warning(f"Could not create index {keys} on {col.name}: {e}")
+
 # Folders
 GENERATED_PDFS_FOLDER = os.path.join(os.path.dirname(__file__), "generated_pdfs")
-UPLOADS_FOLDER = os.path.join(os.path.dirname(__file__), "uploads")
 os.makedirs(GENERATED_PDFS_FOLDER, exist_ok=True)
-os.makedirs(UPLOADS_FOLDER, exist_ok=True)
+
+# PDF engine: "weasyprint" renders in-process, "wkhtmltopdf" spawns a process per PDF
+PDF_ENGINE = os.environ.get("PDF_ENGINE", "weasyprint").lower()
+if PDF_ENGINE == "weasyprint":
+    try:
+        from weasyprint import HTML as WeasyHTML
+    except (ImportError, OSError) as e:
+        logging.warning(f"WeasyPrint unavailable, falling back to wkhtmltopdf: {e}")
+        PDF_ENGINE = "wkhtmltopdf"
 
 # PDFKit config
 # Note: WKHTMLTOPDF_PATH should be configured based on your system.
 WKHTMLTOPDF_PATH = os.environ.get("WKHTMLTOPDF_PATH", r"C:\Program Files\wkhtmltopdf\bin\wkhtmltopdf.exe")
-pdfkit_config = pdfkit.configuration(wkhtmltopdf=WKHTMLTOPDF_PATH)
+pdfkit_config = pdfkit.configuration(wkhtmltopdf=WKHTMLTOPDF_PATH) if PDF_ENGINE == "wkhtmltopdf" else None
+
+# Jinja2 environment for DB-stored templates. from_string() bypasses the
+# environment's own cache, so compiled templates are kept in a bounded LRU below.
+JINJA_ENV = Environment(autoescape=False, auto_reload=False)
+
+# Brevo HTTP session (keep-alive connection pool shared across sends)
+BREVO_SESSION = requests.Session()
+BREVO_SESSION.mount("https://", HTTPAdapter(pool_connections=10, pool_maxsize=10,
+                                            max_retries=Retry(total=3, backoff_factor=0.3)))
+
+# Password hashing
+password_hasher = PasswordHasher()
+
+# Candidate fields rendered in the home dashboard table
+CANDIDATE_TABLE_FIELDS = {
+    "name": 1, "email": 1, "role": 1, "start_date": 1, "end_date": 1,
+    "documents.file_type": 1, "documents.file_path": 1,
+}
 
 # ---------------- USER MODEL AND ROLE-BASED ACCESS CONTROL ---------------- #
 class User(UserMixin):
@@ -137,56 +226,98 @@ def inline_css(filename="style.css"):
     with open(css_path, "r", encoding="utf-8") as f:
         return f.read()
 
+# Static assets never change while the app runs, so read/encode them once
+_LOGO_B64 = load_base64_logo()
+_CSS = inline_css()
+
+def wrap_html(body):
+    # Shared shell for PDFs and previews; Flask caches the compiled template.
+    # Uses jinja_env directly so it also works in bulk-upload worker processes.
+    return app.jinja_env.get_template("_pdf_shell.html").render(body=body, logo=_LOGO_B64, css=_CSS)
+
+def warm_pdf_engine():
+    # Render a throwaway PDF so font discovery happens once up front: WeasyPrint
+    # keeps its font config in-process, and wkhtmltopdf's first run builds the
+    # on-disk fontconfig cache that later per-document processes reuse.
+    html = wrap_html("")
+    try:
+        if PDF_ENGINE == "weasyprint":
+            WeasyHTML(string=html, base_url=app.static_folder).write_pdf()
+        else:
+            pdfkit.from_string(html, False, configuration=pdfkit_config,
+                               options={"enable-local-file-access": None, "quiet": ""})
+    except Exception as e:
+        logging.warning(f"PDF engine warm-up failed: {e}")
+
+# Warm the web process in the background so startup isn't blocked; this runs
+# under flask run / WSGI servers too. Render workers warm in their initializer.
+if not IS_RENDER_WORKER:
+    threading.Thread(target=warm_pdf_engine, daemon=True).start()
+
 def ensure_datetime(candidate, field):
     if candidate.get(field):
         if isinstance(candidate[field], str):
+            # fromisoformat is far cheaper; fall back to dateutil for other formats
             try:
-                candidate[field] = parse(candidate[field])
+                candidate[field] = datetime.fromisoformat(candidate[field])
             except ValueError:
-                candidate[field] = None
-
-def render_template_content(template_str, candidate):
+                try:
+                    candidate[field] = parse(candidate[field])
+                except (ValueError, OverflowError):
+                    candidate[field] = None
+
+@lru_cache(maxsize=400)
+def _compile_template(template_id, updated_at, content):
+    return JINJA_ENV.from_string(content)
+
+def _get_compiled(template):
+    # Keyed on content as well as _id + updated_at, so an edit is picked up in
+    # every process (web and render workers); old versions age out of the LRU
+    return _compile_template(template.get("_id"), template.get("updated_at"), template["content"])
+
+def date_context():
+    today = datetime.today()
+    return {"date": today.strftime("%B %d, %Y"), "current_year": today.year}
+
+def render_template_content(template, candidate, compiled=None, dates=None):
+    dates = dates or date_context()
     context = {
         "name": candidate.get("name", ""),
         "email": candidate.get("email", ""),
         "role": candidate.get("role", ""),
         "start_date": candidate.get("start_date"),
         "end_date": candidate.get("end_date"),
-        "date": datetime.today().strftime("%B %d, %Y"),
-        "current_year": datetime.today().year,
+        "date": dates["date"],
+        "current_year": dates["current_year"],
     }
-    jinja_template = Template(template_str)
-    return jinja_template.render(**context)
+    return (compiled or _get_compiled(template)).render(**context)
 
-def generate_pdf(candidate, template, filename):
+def generate_pdf(candidate, template, filename, compiled=None, dates=None):
     ensure_datetime(candidate, "start_date")
     ensure_datetime(candidate, "end_date")
-    rendered_html = render_template_content(template["content"], candidate)
-
-    html = f"""
-    <html>
-    <head><style>{inline_css()}</style></head>
-    <body>
-        <img src="data:image/png;base64,{load_base64_logo()}" style="max-height:60px;"><br><br>
-        {rendered_html}
-    </body>
-    </html>
-    """
+    rendered_html = render_template_content(template, candidate, compiled, dates)
+
+    html = wrap_html(rendered_html)
 
     filepath = os.path.join(GENERATED_PDFS_FOLDER, filename)
-    pdfkit.from_string(html, filepath, configuration=pdfkit_config, options={"enable-local-file-access": None})
+    if PDF_ENGINE == "weasyprint":
+        WeasyHTML(string=html, base_url=app.static_folder).write_pdf(filepath)
+    else:
+        pdfkit.from_string(html, filepath, configuration=pdfkit_config,
+                           options={"enable-local-file-access": None, "quiet": ""})
     return filename
 
-def generate_docx(candidate, template, filename):
+def generate_docx(candidate, template, filename, compiled=None, dates=None):
     ensure_datetime(candidate, "start_date")
     ensure_datetime(candidate, "end_date")
+    dates = dates or date_context()
     context = {
         "name": candidate["name"],
         "email": candidate["email"],
         "role": candidate.get("role", ""),
         "start_date": candidate.get("start_date"),
         "end_date": candidate.get("end_date"),
-        "date": datetime.today().strftime("%B %d, %Y"),
+        "date": dates["date"],
     }
 
     filepath = os.path.join(GENERATED_PDFS_FOLDER, filename)
@@ -197,12 +328,68 @@ def generate_docx(candidate, template, filename):
     except Exception as e:
         logging.error(f"Error generating DOCX from template. Falling back to simple docx. Exception: {e}")
         from docx import Document
-        rendered_text = render_template_content(template["content"], candidate)
+        rendered_text = render_template_content(template, candidate, compiled, dates)
         doc = Document()
         doc.add_paragraph(rendered_text)
         doc.save(filepath)
     return filename
 
+def _init_render_worker():
+    # Pool workers are long-lived, so an in-process engine is worth warming once
+    # per worker; wkhtmltopdf already shares the fontconfig cache on disk.
+    if PDF_ENGINE == "weasyprint":
+        warm_pdf_engine()
+
+def _render_batch(batch):
+    # Top-level so it can be pickled and run in a ProcessPoolExecutor worker.
+    # Templates travel once per batch and documents refer to them by index;
+    # compiled templates stay in this worker's cache across batches and uploads.
+    # Returns one error message (or None) per document, in order.
+    templates, jobs, dates = batch
+    errors = []
+    for candidate, docs in jobs:
+        for template_index, filename, kind in docs:
+            template = templates[template_index]
+            try:
+                if kind == "pdf":
+                    generate_pdf(candidate, template, filename, _get_compiled(template), dates)
+                else:
+                    generate_docx(candidate, template, filename, _get_compiled(template), dates)
+                errors.append(None)
+            except Exception as e:
+                errors.append(str(e))
+    return errors
+
+_render_pool = None
+_render_pool_lock = threading.Lock()
+
+def get_render_pool():
+    # One long-lived pool for all uploads. "spawn" avoids forking a threaded
+    # Flask/pymongo process, and spawn-based pools only start workers as tasks
+    # need them, so small uploads do not pay for cpu_count processes.
+    global _render_pool
+    with _render_pool_lock:
+        if _render_pool is None:
+            _render_pool = ProcessPoolExecutor(max_workers=os.cpu_count(),
+                                               mp_context=multiprocessing.get_context("spawn"),
+                                               initializer=_init_render_worker)
+        return _render_pool
+
+def reset_render_pool():
+    # A worker crash breaks the whole pool; drop it so the next upload gets a new one
+    global _render_pool
+    with _render_pool_lock:
+        _render_pool = None
+
+def encode_file_base64(path, chunk_size=48 * 1024):
+    # Encode in chunks (a multiple of 3 bytes, so no padding mid-stream) rather
+    # than holding the raw file and its encoding in memory at the same time
+    parts = []
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(chunk_size), b""):
+            parts.append(base64.b64encode(chunk).decode("ascii"))
+    return "".join(parts)
+
 def send_email_brevo(to_email, subject, html_content, attachment_path=None):
     url = "https://api.brevo.com/v3/smtp/email"
     payload = {
@@ -212,32 +399,83 @@ def send_email_brevo(to_email, subject, html_content, attachment_path=None):
         "htmlContent": html_content
     }
     if attachment_path:
-        with open(attachment_path, "rb") as f:
-            payload["attachment"] = [{
-                "name": os.path.basename(attachment_path),
-                "content": base64.b64encode(f.read()).decode()
-            }]
+        payload["attachment"] = [{
+            "name": os.path.basename(attachment_path),
+            "content": encode_file_base64(attachment_path)
+        }]
     headers = {"accept": "application/json", "api-key": BREVO_API_KEY, "content-type": "application/json"}
-    response = requests.post(url, json=payload, headers=headers)
+    try:
+        response = BREVO_SESSION.post(url, json=payload, headers=headers, timeout=10)
+    except requests.RequestException as e:
+        logging.error(f"Error sending email via Brevo: {e}")
+        return False
     return response.status_code in [200, 201]
 
-def log_audit(candidate_id, template_id, action):
-    audit_col.insert_one({
+def check_password(user_data, password):
+    stored_hash = user_data.get("password_hash")
+    if stored_hash:
+        try:
+            password_hasher.verify(stored_hash, password)
+        except (VerificationError, InvalidHashError):
+            return False
+        if password_hasher.check_needs_rehash(stored_hash):
+            users_col.update_one({"_id": user_data["_id"]}, {"$set": {"password_hash": password_hasher.hash(password)}})
+        return True
+    # Legacy plaintext password: verify in constant time, then upgrade to a hash
+    legacy = user_data.get("password")
+    if legacy is None or not hmac.compare_digest(legacy.encode("utf-8"), password.encode("utf-8")):
+        return False
+    users_col.update_one(
+        {"_id": user_data["_id"]},
+        {"$set": {"password_hash": password_hasher.hash(password)}, "$unset": {"password": ""}}
+    )
+    return True
+
+def candidate_search_query(term):
+    # Escaped, case-insensitive prefix match on name or email, so an exact
+    # email matches only itself. Each $or branch can be answered from the
+    # name/email index instead of scanning the collection.
+    pattern = {"$regex": "^" + re.escape(term), "$options": "i"}
+    return {"$or": [{"name": pattern}, {"email": pattern}]}
+
+def zip_response(zs, download_name):
+    # Stream the archive as it is built instead of buffering it in memory
+    resp = Response(zs, mimetype="application/zip")
+    if zs.sized:
+        # Stored (uncompressed) archives have a known size up front
+        resp.headers["Content-Length"] = str(len(zs))
+    # Same filename handling as send_file: Werkzeug quotes the value, and
+    # non-ASCII names get an ASCII fallback plus an RFC 5987 filename*
+    try:
+        download_name.encode("ascii")
+        names = {"filename": download_name}
+    except UnicodeEncodeError:
+        simple = unicodedata.normalize("NFKD", download_name).encode("ascii", "ignore").decode("ascii")
+        names = {"filename": simple, "filename*": f"UTF-8''{quote(download_name, safe='!#$&+^`|~')}"}
+    resp.headers.set("Content-Disposition", "attachment", **names)
+    return resp
+
+def audit_entry(candidate_id, template_id, action):
+    return {
         "candidate_id": candidate_id,
         "template_id": template_id,
         "action": action,
         "timestamp": datetime.utcnow(),
         "user_id": str(current_user.id)
-    })
+    }
+
+def log_audit(candidate_id, template_id, action):
+    audit_col.insert_one(audit_entry(candidate_id, template_id, action))
 
 # ---------------- ROUTES ---------------- #
 @app.route("/login", methods=["GET", "POST"])
 def login():
     form = LoginForm()
     if form.validate_on_submit():
-        # Find user by username and password
-        user_data = users_col.find_one({"username": form.username.data, "password": form.password.data})
-        if user_data:
+        # Find user by username, then verify the password locally
+        user_data = users_col.find_one({"username": form.username.data},
+                                       {"username": 1, "role": 1, "password": 1, "password_hash": 1})
+        if user_data and check_password(user_data, form.password.data):
             # Check if the submitted role matches the role in the database
             if user_data.get('role') == form.role.data:
                 # Load user with their role from the database
@@ -268,7 +506,7 @@ def create_user():
         else:
             users_col.insert_one({
                 "username": form.username.data,
-                "password": form.password.data,
+                "password_hash": password_hasher.hash(form.password.data),
                 "role": form.role.data # Save the selected role
             })
             flash(f"User '{form.username.data}' created successfully!", "success")
@@ -296,6 +534,9 @@ def delete_user(user_id):
 @login_required
 def home():
     search_query = request.args.get("search", "").strip()
+    if not search_query:
+        # Safe to compress only when the search term isn't echoed beside the CSRF token
+        after_this_request(compress.after_request)
     query = {}
     
     # Staff users can now see all candidates
@@ -304,24 +545,26 @@ def home():
         pass
     elif search_query:
         # HR/Admin can search
-        query = {"$or": [
-            {"name": {"$regex": search_query, "$options": "i"}},
-            {"email": {"$regex": search_query, "$options": "i"}}
-        ]}
+        query = candidate_search_query(search_query)
     
-    candidates = list(candidates_col.find(query))
-    templates = list(templates_col.find())
+    # Only the fields the dashboard table needs
+    candidates = list(candidates_col.find(query, CANDIDATE_TABLE_FIELDS))
+    templates = list(templates_col.find({}, {"name": 1, "type": 1}))
     audit_logs_list = list(audit_col.find().sort("timestamp", -1).limit(20))
 
     for c in candidates:
         ensure_datetime(c, "start_date")
         ensure_datetime(c, "end_date")
 
+    # Resolve names for all logs with one $in query per collection
+    cand_ids = {ObjectId(l["candidate_id"]) for l in audit_logs_list if l.get("candidate_id")}
+    tmpl_ids = {ObjectId(l["template_id"]) for l in audit_logs_list if l.get("template_id")}
+    cand_map = {c["_id"]: c.get("name") for c in candidates_col.find({"_id": {"$in": list(cand_ids)}}, {"name": 1})} if cand_ids else {}
+    tmpl_map = {t["_id"]: t.get("name") for t in templates_col.find({"_id": {"$in": list(tmpl_ids)}}, {"name": 1})} if tmpl_ids else {}
+
     for log in audit_logs_list:
-        candidate = candidates_col.find_one({"_id": ObjectId(log.get("candidate_id"))}) if log.get("candidate_id") else None
-        template = templates_col.find_one({"_id": ObjectId(log.get("template_id"))}) if log.get("template_id") else None
-        log["candidate_name"] = candidate["name"] if candidate else "N/A"
-        log["template_name"] = template["name"] if template else "N/A"
+        log["candidate_name"] = cand_map.get(ObjectId(log["candidate_id"]), "N/A") if log.get("candidate_id") else "N/A"
+        log["template_name"] = tmpl_map.get(ObjectId(log["template_id"]), "N/A") if log.get("template_id") else "N/A"
         if not isinstance(log.get("timestamp"), datetime):
             log["timestamp"] = datetime.utcnow()
 
@@ -348,15 +591,22 @@ def bulk_upload():
             flash("No file selected", "danger")
             return redirect(request.url)
 
-        filepath = os.path.join(UPLOADS_FOLDER, file.filename)
-        file.save(filepath)
-
         try:
-            df = pd.read_csv(filepath) if file.filename.endswith(".csv") else pd.read_excel(filepath)
+            # Parse straight from the upload instead of staging it on disk
+            stream = io.BytesIO(file.read())
+            read = pd.read_csv if file.filename.lower().endswith(".csv") else pd.read_excel
+            df = read(stream, dtype=str, keep_default_na=False)
             templates = list(templates_col.find())
 
-            for _, row in df.iterrows():
+            # Same date values for every document in this upload
+            dates = date_context()
+            candidates_to_insert = []
+            jobs = []
+            for row in df.to_dict("records"):
+                # Allocate the id up front so filenames can embed it before insertion
+                candidate_id = ObjectId()
                 candidate = {
+                    "_id": candidate_id,
                     "name": row.get("name"),
                     "email": row.get("email"),
                     "role": row.get("role"),
@@ -364,30 +614,73 @@ def bulk_upload():
                     "end_date": row.get("end_date"),
                     "documents": []
                 }
-                inserted = candidates_col.insert_one(candidate)
-                candidate_id = inserted.inserted_id
-
-                for template in templates:
-                    # Fix: Use a single filename variable
-                    filename = f"{template['type']}_{candidate_id}_{datetime.now().strftime('%Y%m%d%H%M%S')}"
-                    
-                    pdf_filename = filename + ".pdf"
-                    generate_pdf(candidate, template, pdf_filename)
-                    candidates_col.update_one(
-                        {"_id": candidate_id},
-                        {"$push": {"documents": {"file_type": f"{template['type']}_pdf", "file_path": pdf_filename, "template_id": str(template['_id'])}}}
-                    )
-                    log_audit(str(candidate_id), str(template["_id"]), f"Bulk Generated {template['type'].upper()}_PDF")
-
-                    docx_filename = filename + ".docx"
-                    generate_docx(candidate, template, docx_filename)
-                    candidates_col.update_one(
-                        {"_id": candidate_id},
-                        {"$push": {"documents": {"file_type": f"{template['type']}_docx", "file_path": docx_filename, "template_id": str(template['_id'])}}}
-                    )
-                    log_audit(str(candidate_id), str(template["_id"]), f"Bulk Generated {template['type'].upper()}_DOCX")
-
-            flash("Bulk upload + auto-generation successful!", "success")
+                # Store real dates so readers don't have to parse strings
+                ensure_datetime(candidate, "start_date")
+                ensure_datetime(candidate, "end_date")
+                candidates_to_insert.append(candidate)
+
+                docs = []
+                for template_index, template in enumerate(templates):
+                    # Include the template id so same-type templates never share a path
+                    filename = f"{template['type']}_{candidate_id}_{template['_id']}_{datetime.now().strftime('%Y%m%d%H%M%S')}"
+                    docs.append((template_index, filename + ".pdf", "pdf"))
+                    docs.append((template_index, filename + ".docx", "docx"))
+                jobs.append((candidate, docs))
+
+            if candidates_to_insert:
+                candidates_col.insert_many(candidates_to_insert, ordered=False)
+
+            # PDF rendering dominates bulk uploads, so run generations across processes,
+            # sending candidates in batches (about four per worker)
+            pool = get_render_pool()
+            render_templates = [{"_id": t["_id"], "updated_at": t.get("updated_at"), "content": t["content"]}
+                                for t in templates]
+            batch_size = max(1, -(-len(jobs) // ((os.cpu_count() or 1) * 4)))
+            futures = []
+            for start in range(0, len(jobs), batch_size):
+                batch = jobs[start:start + batch_size]
+                futures.append((pool.submit(_render_batch, (render_templates, batch, dates)), batch))
+
+            # Record every document that rendered, even if others failed
+            documents_by_candidate = {}
+            audits = []
+            total = sum(len(docs) for _, docs in jobs)
+            failed = 0
+            for future, batch in futures:
+                count = sum(len(docs) for _, docs in batch)
+                try:
+                    errors = future.result()
+                except BrokenProcessPool as e:
+                    reset_render_pool()
+                    errors = [f"render pool broke: {e}"] * count
+                except Exception as e:
+                    errors = [str(e)] * count
+                outcomes = iter(errors)
+                for candidate, docs in batch:
+                    for template_index, filename, kind in docs:
+                        error = next(outcomes)
+                        if error:
+                            logging.error(f"Error generating {filename}: {error}")
+                            failed += 1
+                            continue
+                        template = templates[template_index]
+                        documents_by_candidate.setdefault(candidate["_id"], []).append(
+                            {"file_type": f"{template['type']}_{kind}", "file_path": filename, "template_id": str(template['_id'])}
+                        )
+                        audits.append(audit_entry(str(candidate["_id"]), str(template["_id"]), f"Bulk Generated {template['type'].upper()}_{kind.upper()}"))
+
+            if documents_by_candidate:
+                candidates_col.bulk_write([
+                    UpdateOne({"_id": candidate_id}, {"$push": {"documents": {"$each": docs}}})
+                    for candidate_id, docs in documents_by_candidate.items()
+                ], ordered=False)
+            if audits:
+                audit_col.insert_many(audits, ordered=False)
+
+            if failed:
+                flash(f"Bulk upload finished, but {failed} of {total} documents failed to generate.", "warning")
+            else:
+                flash("Bulk upload + auto-generation successful!", "success")
         except Exception as e:
             flash(f"Error processing file: {e}", "danger")
         return redirect(url_for("bulk_upload"))
@@ -398,14 +691,17 @@ def bulk_upload():
 def add_candidate():
     form = CandidateForm()
     if form.validate_on_submit():
-        candidates_col.insert_one({
+        candidate = {
             "name": form.name.data,
             "email": form.email.data,
             "role": form.role.data,
             "start_date": form.start_date.data,
             "end_date": form.end_date.data,
             "documents": []
-        })
+        }
+        ensure_datetime(candidate, "start_date")
+        ensure_datetime(candidate, "end_date")
+        candidates_col.insert_one(candidate)
         flash(f"Candidate '{form.name.data}' added successfully!", "success")
     else:
         flash("Please fill in required fields", "danger")
@@ -436,7 +732,8 @@ def manage_templates():
             "name": form.name.data,
             "type": form.type.data,
             "content": form.content.data,
-            "created_at": datetime.utcnow()
+            "created_at": datetime.utcnow(),
+            "updated_at": datetime.utcnow()
         })
         flash("Template created successfully!", "success")
         return redirect(url_for("manage_templates"))
@@ -454,7 +751,8 @@ def edit_template(id):
     if request.method == "POST" and form.validate_on_submit():
         templates_col.update_one(
             {"_id": ObjectId(id)},
-            {"$set": {"name": form.name.data, "type": form.type.data, "content": form.content.data}}
+            {"$set": {"name": form.name.data, "type": form.type.data, "content": form.content.data,
+                      "updated_at": datetime.utcnow()}}
         )
         log_audit(None, id, f"Template edited: {form.name.data}")
         flash("Template updated successfully!", "success")
@@ -476,11 +774,11 @@ def delete_template(id):
 @app.route("/search_candidates", methods=["GET"])
 @staff_required # All roles can search/view candidates
 def search_candidates():
-    query = request.args.get("q", "")
+    query = request.args.get("q", "").strip()
     if current_user.role == 'staff':
-        results = candidates_col.find({}) # Staff can view all candidates
+        results = candidates_col.find({}, {"documents": 0}) # Staff can view all candidates
     else:
-        results = candidates_col.find({"name": {"$regex": query, "$options": "i"}})
+        results = candidates_col.find(candidate_search_query(query), {"documents": 0})
     return render_template("search_results.html", results=results, query=query)
 
 @app.route("/generate_document/<candidate_id>/<template_id>/<doc_type>")
@@ -517,7 +815,10 @@ def generate_document(candidate_id, template_id, doc_type):
 @app.route("/download/<filename>")
 @staff_required # All roles can download documents
 def download_generated(filename):
-    return send_from_directory(GENERATED_PDFS_FOLDER, filename, as_attachment=True)
+    resp = send_from_directory(GENERATED_PDFS_FOLDER, filename, as_attachment=True, conditional=True)
+    # Generated filenames are timestamped, so their contents never change
+    resp.headers["Cache-Control"] = "private, max-age=31536000, immutable"
+    return resp
 
 @app.route("/send_email/<candidate_id>/<template_id>/<doc_type>")
 @staff_required # Admins, HR, and Staff can now send emails
@@ -544,6 +845,7 @@ def send_email(candidate_id, template_id, doc_type):
 
 @app.route("/preview/<candidate_id>/<template_id>")
 @staff_required # All roles can preview documents
+@compress.compressed()
 def preview(candidate_id, template_id):
     candidate = candidates_col.find_one({"_id": ObjectId(candidate_id)})
     template = templates_col.find_one({"_id": ObjectId(template_id)})
@@ -551,17 +853,8 @@ def preview(candidate_id, template_id):
     if not candidate or not template:
         flash("Candidate or Template not found", "danger")
         return redirect(url_for("home"))
-    
-    html = f"""
-    <html>
-      <head><style>{inline_css()}</style></head>
-      <body>
-        <img src="data:image/png;base64,{load_base64_logo()}" alt="Logo" style="max-height:60px;"><br><br>
-        {render_template_content(template["content"], candidate)}
-      </body>
-    </html>
-    """
-    return html
+
+    return wrap_html(render_template_content(template, candidate))
 
 @app.route("/clear_candidates", methods=["POST"])
 @admin_required # Only admins can clear all candidates
@@ -576,50 +869,36 @@ def clear_candidates():
 @app.route("/download_all/<candidate_id>")
 @staff_required # Admins, HR, and Staff can download all docs for a candidate
 def download_all(candidate_id):
-    candidate = candidates_col.find_one({"_id": ObjectId(candidate_id)})
+    candidate = candidates_col.find_one({"_id": ObjectId(candidate_id)}, {"name": 1, "documents.file_path": 1})
     if not candidate:
         flash("Candidate not found", "danger")
         return redirect(url_for("home"))
 
-    mem = io.BytesIO()
-    with zipfile.ZipFile(mem, "w", zipfile.ZIP_DEFLATED) as zf:
-        for doc in candidate.get("documents", []):
-            file_path = os.path.join(GENERATED_PDFS_FOLDER, doc["file_path"])
-            if os.path.exists(file_path):
-                zf.write(file_path, arcname=doc["file_path"])
-
-    mem.seek(0)
-    return send_file(
-        mem,
-        as_attachment=True,
-        download_name=f"{candidate['name']}_documents.zip",
-        mimetype="application/zip"
-    )
+    zs = ZipStream(compress_type=zipfile.ZIP_STORED, sized=True)
+    for doc in candidate.get("documents", []):
+        file_path = os.path.join(GENERATED_PDFS_FOLDER, doc["file_path"])
+        if os.path.exists(file_path):
+            zs.add_path(file_path, arcname=doc["file_path"])
+
+    return zip_response(zs, f"{candidate['name']}_documents.zip")
 
 @app.route("/download_all_candidates")
 @admin_required # Only admins can download all docs for all candidates
 def download_all_candidates():
-    candidates = list(candidates_col.find())
+    candidates = list(candidates_col.find({}, {"name": 1, "documents.file_path": 1}))
     if not candidates:
         flash("No candidates found", "danger")
         return redirect(url_for("home"))
 
-    mem = io.BytesIO()
-    with zipfile.ZipFile(mem, "w", zipfile.ZIP_DEFLATED) as zf:
-        for candidate in candidates:
-            candidate_name = candidate.get("name", f"candidate_{candidate['_id']}")
-            for doc in candidate.get("documents", []):
-                file_path = os.path.join(GENERATED_PDFS_FOLDER, doc["file_path"])
-                if os.path.exists(file_path):
-                    zf.write(file_path, arcname=os.path.join(candidate_name, doc["file_path"]))
-
-    mem.seek(0)
-    return send_file(
-        mem,
-        as_attachment=True,
-        download_name="all_candidates_documents.zip",
-        mimetype="application/zip"
-    )
+    zs = ZipStream(compress_type=zipfile.ZIP_STORED, sized=True)
+    for candidate in candidates:
+        candidate_name = candidate.get("name", f"candidate_{candidate['_id']}")
+        for doc in candidate.get("documents", []):
+            file_path = os.path.join(GENERATED_PDFS_FOLDER, doc["file_path"])
+            if os.path.exists(file_path):
+                zs.add_path(file_path, arcname=os.path.join(candidate_name, doc["file_path"]))
+
+    return zip_response(zs, "all_candidates_documents.zip")
 
 # ---------------- RUN ---------------- #
 if __name__ == "__main__":
@@ -627,7 +906,7 @@ if __name__ == "__main__":
     if not users_col.find_one({"username": "Admin"}):
         users_col.insert_one({
             "username": "Admin",
-            "password": "Admin@123",
+            "password_hash": password_hasher.hash("Admin@123"),
             "role": "admin"
         })
     app.run(debug=True)
@@ -2,6 +2,7 @@
 import os
 from pymongo import MongoClient
 from dotenv import load_dotenv
+from argon2 import PasswordHasher
 
 # Load environment variables
 load_dotenv()
@@ -18,7 +19,7 @@ users_col.delete_many({})  # ⚠️ This removes all users
 # Create fresh admin
 users_col.insert_one({
     "username": "Admin",
-    "password": "Admin@123",
+    "password_hash": PasswordHasher().hash("Admin@123"),
     "role": "admin"
 })
 